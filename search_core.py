@@ -0,0 +1,56 @@
+import html
+import re
+import streamlit as st
+from supabase import create_client, ClientOptions
+
+PAGE_SIZE = 25
+# Words Postgres' english config drops anyway; a query made only of these can't match anything
+STOPWORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'of', 'to', 'is', 'in', 'it', 'on'})
+_WORD_RE = re.compile(r'\w+')
+_TITLE_TMPL = '<div class="result-title"><a href="{url}" target="_blank">📄 {title}</a></div>'
+
+# --- DB CONNECTION ---
+@st.cache_resource
+def init_connection():
+    # One client (and one keep-alive HTTP pool) per Streamlit process. No user sessions here,
+    # so skip the auth session storage and token refresh timer.
+    options = ClientOptions(auto_refresh_token=False, persist_session=False, postgrest_client_timeout=10)
+    return create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"], options=options)
+
+# --- QUERY GUARD ---
+def is_searchable(query):
+    """False for queries with no word of 2+ chars left after dropping stopwords."""
+    tokens = [t for t in _WORD_RE.findall(query.lower()) if t not in STOPWORDS]
+    return any(len(t) >= 2 for t in tokens)
+
+# --- SEARCH (CACHED) ---
+@st.cache_data(ttl=60, max_entries=256, show_spinner=False)
+def run_search(query, page):
+    """Fetches one ranked page of results. Identical (query, page) pairs within a minute are served from memory."""
+    # search_notes (supabase/migrations) ranks + highlights server-side; every row carries the total
+    res = init_connection().rpc("search_notes", {"q": query, "lim": PAGE_SIZE, "off": page * PAGE_SIZE}).execute()
+    results = res.data or []
+    count = results[0]["total"] if results else 0
+    return results, count
+
+# --- RESULT RENDERER ---
+def result_html(item):
+    """One result card as HTML: title link, date, highlighted snippet and the full note."""
+    # No raw newlines: a blank line would end the HTML block and spill the rest through the markdown parser
+    content = html.escape(item.get('content') or "").replace("\n", "&#10;")
+    # Note text is untrusted: escape it, then turn ts_headline's STX/ETX match markers into <mark> tags
+    snippet = html.escape(item.get('snippet') or "").replace("\x02", "<mark>").replace("\x03", "</mark>")
+    # Display just the YYYY-MM-DD
+    date = f'<div class="result-date">{item["created_at"][:10]}</div>' if item.get('created_at') else ""
+    return (
+        _TITLE_TMPL.format(url=html.escape(item['url']), title=html.escape(item['title'] or ""))
+        + date
+        # Snippet (highlighted and whitespace-collapsed server-side)
+        + f'<div class="snippet-text">{snippet}</div>'
+        + f'<details><summary>View Full Note</summary><div class="full-note">{content}</div></details>'
+        + '<hr>'
+    )
+
+def render_results(items):
+    """Renders every card with a single st.markdown call instead of ~5 widgets per result."""
+    st.markdown("".join(result_html(item) for item in items), unsafe_allow_html=True)
@@ -0,0 +1,41 @@
+-- Ranked full-text search over attio_notes, with the highlighted snippet built
+-- in Postgres (ts_headline) so the app doesn't need to regex every result.
+-- websearch_to_tsquery never raises on malformed input, so no plain-text fallback is needed.
+create or replace function search_notes(q text, lim int default 100)
+returns table (
+  id text,
+  title text,
+  url text,
+  created_at text,
+  content text,
+  snippet text,
+  rank real,
+  total bigint
+)
+language sql
+stable
+as $$
+  with query as (
+    select websearch_to_tsquery('english', q) as tsq
+  ),
+  hits as (
+    select n.*, ts_rank_cd(n.fts, query.tsq) as rank, count(*) over () as total
+    from attio_notes n, query
+    where n.fts @@ query.tsq
+    order by rank desc, n.created_at desc
+    limit lim
+  )
+  -- Headlines only for the rows actually returned
+  select
+    hits.id::text,
+    hits.title::text,
+    hits.url::text,
+    hits.created_at::text,
+    hits.content::text,
+    ts_headline('english', coalesce(hits.content, ''), query.tsq,
+                'MaxWords=40, MinWords=15, StartSel=<mark>, StopSel=</mark>'),
+    hits.rank,
+    hits.total
+  from hits, query
+  order by hits.rank desc, hits.created_at desc;
+$$;
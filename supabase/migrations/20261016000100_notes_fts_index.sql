@@ -0,0 +1,12 @@
+-- Store fts as a weighted generated column (title 'A' beats content 'B' in ts_rank_cd)
+-- and index it with GIN, so `fts @@ tsquery` is an index scan instead of a seq scan.
+-- Recreating the column is safe: it is derived entirely from title and content.
+alter table attio_notes drop column if exists fts;
+
+alter table attio_notes
+  add column fts tsvector generated always as (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(content, '')), 'B')
+  ) stored;
+
+create index if not exists attio_notes_fts_gin on attio_notes using gin (fts);
@@ -0,0 +1,20 @@
+-- Let GIN buffer new entries during a sync instead of updating the main index per row.
+-- The pending list is still searched, so results stay correct while it grows.
+alter index attio_notes_fts_gin set (fastupdate = on, gin_pending_list_limit = 16384);
+
+-- Called once at the end of sync_attio.py: merge the pending list in one pass
+-- and refresh planner statistics for the freshly loaded rows.
+create or replace function finish_notes_sync()
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  perform gin_clean_pending_list('attio_notes_fts_gin'::regclass);
+  analyze attio_notes;
+end;
+$$;
+
+revoke execute on function finish_notes_sync() from public, anon, authenticated;
+grant execute on function finish_notes_sync() to service_role;
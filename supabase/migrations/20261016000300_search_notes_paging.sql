@@ -0,0 +1,42 @@
+-- Page through search_notes: `off` skips already-rendered rows, so the app only
+-- pulls (and headlines) the page it is about to show.
+drop function if exists search_notes(text, int);
+
+create function search_notes(q text, lim int default 25, off int default 0)
+returns table (
+  id text,
+  title text,
+  url text,
+  created_at text,
+  content text,
+  snippet text,
+  rank real,
+  total bigint
+)
+language sql
+stable
+as $$
+  with query as (
+    select websearch_to_tsquery('english', q) as tsq
+  ),
+  hits as (
+    select n.*, ts_rank_cd(n.fts, query.tsq) as rank, count(*) over () as total
+    from attio_notes n, query
+    where n.fts @@ query.tsq
+    order by rank desc, n.created_at desc, n.id
+    limit lim offset off
+  )
+  -- Headlines only for the rows actually returned
+  select
+    hits.id::text,
+    hits.title::text,
+    hits.url::text,
+    hits.created_at::text,
+    hits.content::text,
+    ts_headline('english', coalesce(hits.content, ''), query.tsq,
+                'MaxWords=40, MinWords=15, StartSel=<mark>, StopSel=</mark>'),
+    hits.rank,
+    hits.total
+  from hits, query
+  order by hits.rank desc, hits.created_at desc, hits.id;
+$$;
@@ -0,0 +1,3 @@
+-- Fingerprint of (title, content, url, created_at) written by sync_attio.py.
+-- Lets the sync skip notes that haven't changed since the last run.
+alter table attio_notes add column if not exists content_hash text;
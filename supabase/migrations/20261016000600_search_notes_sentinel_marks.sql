@@ -0,0 +1,43 @@
+-- Mark headline matches with control characters (STX/ETX) instead of <mark>.
+-- They are stripped from the note text first, so any that come back were put there
+-- by ts_headline, and the app can swap them for <mark> after HTML-escaping.
+create or replace function search_notes(q text, lim int default 25, off int default 0)
+returns table (
+  id text,
+  title text,
+  url text,
+  created_at text,
+  content text,
+  snippet text,
+  rank real,
+  total bigint
+)
+language sql
+stable
+as $$
+  with query as (
+    select websearch_to_tsquery('english', q) as tsq
+  ),
+  hits as (
+    select n.*, ts_rank_cd(n.fts, query.tsq) as rank, count(*) over () as total
+    from attio_notes n, query
+    where n.fts @@ query.tsq
+    order by rank desc, n.created_at desc, n.id
+    limit lim offset off
+  )
+  -- Headlines only for the rows actually returned
+  select
+    hits.id::text,
+    hits.title::text,
+    hits.url::text,
+    hits.created_at::text,
+    hits.content::text,
+    regexp_replace(
+      ts_headline('english', translate(coalesce(hits.content, ''), chr(2) || chr(3), ''), query.tsq,
+                  'MaxWords=40, MinWords=15, StartSel=' || chr(2) || ', StopSel=' || chr(3)),
+      '\s+', ' ', 'g'),
+    hits.rank,
+    hits.total
+  from hits, query
+  order by hits.rank desc, hits.created_at desc, hits.id;
+$$;
@@ -1,5 +1,13 @@
 import os
+import time
+import hashlib
+import threading
+import queue
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client
 from dotenv import load_dotenv
 
@@ -25,8 +33,133 @@ except Exception as e:
     print(f"   ❌ DB Connection Failed: {e}", flush=True)
     exit(1)
 
-HEADERS = {"Authorization": f"Bearer {ATTIO_API_KEY}", "Accept": "application/json"}
+# One pooled session for every Attio call, so TCP+TLS handshakes are paid once per connection
+SESSION = requests.Session()
+SESSION.headers.update({"Authorization": f"Bearer {ATTIO_API_KEY}", "Accept": "application/json"})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20, pool_maxsize=50,
+    # Connection-level retries only; status retries live in attio_get so every attempt is rate-limited.
+    # raise_on_status=False keeps a final error response a response, not a RetryError.
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[], raise_on_status=False)
+))
+RETRY_STATUSES = {500, 502, 503, 504}
+# (connect, read) seconds; without a read timeout a stalled request would hang a worker forever
+ATTIO_TIMEOUT = (5, 30)
 NAME_CACHE = {} 
+NAME_KEYS = ('name', 'full_name', 'title', 'company_name', 'deal_name', 'email_addresses')
+BATCH_SIZE = 1000
+# Rows flow from the Attio fetch loop to the Supabase writer thread; bounded so a slow DB applies backpressure
+_rows = queue.Queue(maxsize=5000)
+_saved = 0
+
+# --- HELPER: RATE LIMITER ---
+class RateLimiter:
+    """Token bucket shared by all threads. A 429 pauses every caller, not just the one that hit it."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                # No refill while paused, so the bucket restarts empty when the block lifts
+                self.tokens = min(self.capacity, self.tokens + max(0, now - max(self.updated, self.blocked_until)) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+# Attio allows 100 reads/sec per workspace; stay comfortably below it
+LIMITER = RateLimiter(rate=50)
+
+def retry_after(res, attempt):
+    """Seconds to wait after a 429, from Retry-After when present, else exponential backoff."""
+    try: return max(float(res.headers.get("Retry-After")), 0.5)
+    except (TypeError, ValueError): return min(2 ** attempt * 0.5, 30)
+
+# --- HELPER: ATTIO GET ---
+def attio_get(endpoint, params=None, attempts=5):
+    """Rate-limited GET against the Attio v2 API, retrying on 429 and 5xx. Returns the last response."""
+    for attempt in range(attempts):
+        LIMITER.acquire()
+        res = SESSION.get(f"https://api.attio.com/v2/{endpoint}", params=params, timeout=ATTIO_TIMEOUT)
+        if attempt == attempts - 1: break
+        if res.status_code == 429:
+            LIMITER.pause(retry_after(res, attempt))
+        elif res.status_code in RETRY_STATUSES:
+            time.sleep(min(2 ** attempt * 0.5, 30))
+        else: break
+    return res
+
+# --- HELPER: BATCHED UPSERT ---
+def upsert_rows(rows):
+    """Upserts one batch. Returns how many rows were saved."""
+    try:
+        supabase.table("attio_notes").upsert(rows, on_conflict="id").execute()
+        return len(rows)
+    except Exception as e:
+        # One bad row shouldn't sink the whole batch: retry row by row
+        print(f"   ⚠️ Batch Upsert Failed ({e}), retrying row-wise...", flush=True)
+        saved = 0
+        for row in rows:
+            try:
+                supabase.table("attio_notes").upsert(row, on_conflict="id").execute()
+                saved += 1
+            except Exception as row_err:
+                print(f"   ❌ Database Upsert Error ({row['id']}): {row_err}", flush=True)
+        return saved
+
+# --- WRITER THREAD ---
+def writer():
+    """Drains queued rows into batched upserts until the None sentinel arrives."""
+    global _saved
+    # Keyed by id: offset paging over a live list can repeat a note, and one upsert
+    # can't touch the same row twice ("command cannot affect row a second time")
+    batch = {}
+    while True:
+        row = _rows.get()
+        if row is not None: batch[row["id"]] = row
+        if batch and (row is None or len(batch) >= BATCH_SIZE):
+            _saved += upsert_rows(list(batch.values()))
+            print(f"   💾 Saved batch of {len(batch)}. Total so far: {_saved}", flush=True)
+            batch = {}
+        if row is None: return
+
+# --- HELPER: CHANGE DETECTION ---
+def load_hashes():
+    """Maps note id -> content_hash for every stored row, so unchanged notes can be skipped."""
+    hashes, start = {}, 0
+    try:
+        while True:
+            res = supabase.table("attio_notes").select("id,content_hash").order("id").range(start, start + BATCH_SIZE - 1).execute()
+            hashes.update((r["id"], r["content_hash"]) for r in res.data)
+            if len(res.data) < BATCH_SIZE: return hashes
+            start += BATCH_SIZE
+    except Exception as e:
+        print(f"   ⚠️ Could not load stored hashes ({e}), upserting everything.", flush=True)
+        return {}
+
+def row_hash(row):
+    return hashlib.blake2b(orjson.dumps([row["title"], row["content"], row["url"], row["created_at"]]), digest_size=16).hexdigest()
+
+def display_value(entries):
+    """Display text of an attribute's first entry, or None. Personal names and emails don't use `value`."""
+    if not entries: return None
+    entry = entries[0]
+    return entry.get('value') or entry.get('full_name') or entry.get('email_address')
 
 # --- HELPER: GET PARENT NAME ---
 def get_parent_name(slug, record_id):
@@ -36,90 +169,113 @@ def get_parent_name(slug, record_id):
     if cache_key in NAME_CACHE: return NAME_CACHE[cache_key]
 
     try:
-        res = requests.get(f"https://api.attio.com/v2/objects/{slug}/records/{record_id}", headers=HEADERS)
-        if res.status_code != 200: return "Unknown"
-        
-        vals = res.json().get("data", {}).get("values", {})
-        name = "Unknown"
-        for key in ['name', 'full_name', 'title', 'company_name', 'deal_name']:
-            if key in vals and vals[key]:
-                name = vals[key][0]['value']
-                break
-        if name == "Unknown" and 'email_addresses' in vals and vals['email_addresses']:
-            name = vals['email_addresses'][0]['value']
+        res = attio_get(f"objects/{slug}/records/{record_id}")
+    except: return "Unknown" # Network trouble: leave uncached so a later page can retry
+    if res.status_code != 200:
+        # A missing record stays missing for this run; other errors may be transient
+        if res.status_code == 404: NAME_CACHE[cache_key] = "Unknown"
+        return "Unknown"
+
+    try:
+        vals = orjson.loads(res.content).get("data", {}).get("values", {})
+        # First populated attribute wins; email is the last resort
+        name = next((v for v in (display_value(vals.get(key)) for key in NAME_KEYS) if v), "Unknown")
+    except: name = "Unknown"
             
-        NAME_CACHE[cache_key] = name
-        return name
-    except: return "Unknown"
+    NAME_CACHE[cache_key] = name
+    return name
 
-# --- MAIN SYNC: ALL NOTES ---
-def sync_all_notes():
-    print("\n🔎 Fetching all notes globally from Attio...", flush=True)
-    
-    # EXACT ALIGNMENT WITH API DOCS: Max limit is 50
-    limit = 50 
+# --- HELPER: PAGINATED GET ---
+def paged(endpoint, limit):
+    """Yields one page of `data` at a time, stopping at the first short or failed page."""
     offset = 0
-    total_synced = 0
-    
     while True:
         params = {"limit": limit, "offset": offset}
-        res = requests.get("https://api.attio.com/v2/notes", headers=HEADERS, params=params)
+        res = attio_get(endpoint, params=params)
         
         if res.status_code != 200:
             print(f"   ❌ API Error {res.status_code}: {res.text}", flush=True)
-            break
+            return
             
-        notes = res.json().get("data",[])
-        if not notes: 
-            break # Reached the end
+        data = orjson.loads(res.content).get("data",[])
+        if not data: 
+            return # Reached the end
+        yield data
             
-        batch =[]
-        for n in notes:
-            try:
-                # 1. Extract raw data
-                note_id = n['id']['note_id']
-                parent_id = n.get('parent_record_id')
-                parent_slug = n.get('parent_object') 
+        if len(data) < limit: return
+        offset += limit
+
+# --- MAIN SYNC: ALL NOTES ---
+def sync_all_notes():
+    print("\n🔎 Fetching all notes globally from Attio...", flush=True)
+    
+    stored_hashes = load_hashes()
+    unchanged = 0
+    # Supabase writes happen on their own thread, overlapping with the Attio fetches below
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    # Parent lookups are pure network waits, so fan them out across threads
+    pool = ThreadPoolExecutor(max_workers=20)
+    
+    try:
+        # EXACT ALIGNMENT WITH API DOCS: Max limit is 50
+        for notes in paged("notes", limit=50):
+            # Warm NAME_CACHE for the page's distinct, not-yet-cached parents; the loop below then reads from it
+            parents = {(n.get('parent_object'), n.get('parent_record_id')) for n in notes}
+            missing = [p for p in parents if f"{p[0]}:{p[1]}" not in NAME_CACHE]
+            list(pool.map(lambda p: get_parent_name(*p), missing))
+            
+            for n in notes:
+                try:
+                    # 1. Extract raw data
+                    note_id = n['id']['note_id']
+                    parent_id = n.get('parent_record_id')
+                    parent_slug = n.get('parent_object') 
                 
-                content = n.get('content_plaintext', '').strip()
-                raw_title = n.get('title', '').strip()
+                    content = n.get('content_plaintext', '').strip()
+                    raw_title = n.get('title', '').strip()
                 
-                # 2. Get the name of the Company/Person
-                parent_name = get_parent_name(parent_slug, parent_id)
+                    # 2. Get the name of the Company/Person (fetched above; never re-fetched per note)
+                    parent_name = NAME_CACHE.get(f"{parent_slug}:{parent_id}", "Unknown")
                 
-                # 3. Build a beautiful title
-                if raw_title and raw_title != "Untitled":
-                    final_title = f"Note: {raw_title} ({parent_name})"
-                elif content:
-                    snippet = content[:50].replace('\n', ' ')
-                    final_title = f"Note: {snippet}... ({parent_name})"
-                else:
-                    final_title = f"Empty Note ({parent_name})"
-
-                # 4. Append to database batch
-                batch.append({
-                    "id": note_id,
-                    "title": final_title,
-                    "content": content,
-                    "url": f"https://app.attio.com/w/workspace/note/{note_id}",
-                    "created_at": n.get("created_at")
-                })
-            except Exception as e:
-                print(f"   ⚠️ Error parsing note: {e}", flush=True)
-        
-        # 5. Save to Supabase
-        if batch:
-            try:
-                supabase.table("attio_notes").upsert(batch).execute()
-                total_synced += len(batch)
-                print(f"   💾 Saved batch of {len(batch)}. Total so far: {total_synced}", flush=True)
-            except Exception as e:
-                print(f"   ❌ Database Upsert Error: {e}", flush=True)
-            
-        if len(notes) < limit: break
-        offset += limit
+                    # 3. Build a beautiful title
+                    if raw_title and raw_title != "Untitled":
+                        final_title = f"Note: {raw_title} ({parent_name})"
+                    elif content:
+                        snippet = content[:50].replace('\n', ' ')
+                        final_title = f"Note: {snippet}... ({parent_name})"
+                    else:
+                        final_title = f"Empty Note ({parent_name})"
+
+                    row = {
+                        "id": note_id,
+                        "title": final_title,
+                        "content": content,
+                        "url": f"https://app.attio.com/w/workspace/note/{note_id}",
+                        "created_at": n.get("created_at")
+                    }
+
+                    # 4. Hand off to the writer thread, unless nothing changed since the last sync
+                    row["content_hash"] = row_hash(row)
+                    if stored_hashes.get(note_id) == row["content_hash"]:
+                        unchanged += 1
+                        continue
+                    _rows.put(row)
+                except Exception as e:
+                    print(f"   ⚠️ Error parsing note: {e}", flush=True)
+    finally:
+        # 5. Even if fetching fails, flush what was already queued and wait for the last upsert
+        pool.shutdown()
+        _rows.put(None)
+        writer_thread.join()
+
+    # Merge the GIN pending list built up during the sync in one pass
+    try:
+        supabase.rpc("finish_notes_sync").execute()
+    except Exception as e:
+        print(f"   ⚠️ Index maintenance skipped: {e}", flush=True)
         
-    print(f"\n✅ Sync Complete! Total Notes Synced: {total_synced}", flush=True)
+    print(f"\n✅ Sync Complete! Total Notes Synced: {_saved} (unchanged, skipped: {unchanged})", flush=True)
 
 if __name__ == "__main__":
     sync_all_notes()